@@ -0,0 +1,254 @@
+import json
+import time
+import asyncio
+from itertools import count
+from typing import Dict, List, Optional
+from aiohttp import web
+
+# Фразы в ответах бота, по которым сценарий считается завершенным с ошибкой
+ERROR_MARKERS = ('ошибк', 'слишком большой', 'не найдено', 'не удалось')
+
+BOT_USER = {
+    'id': 1,
+    'is_bot': True,
+    'first_name': 'FakeBot',
+    'username': 'fake_bot'
+}
+
+class BotApiError(Exception):
+    """Бот ответил пользователю сообщением об ошибке"""
+
+class FakeTelegramServer:
+    """Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+    Реализует методы, которые использует бот (getUpdates, getFile и скачивание
+    файлов, sendMessage, editMessageText, sendDocument, answerCallbackQuery,
+    deleteMessage), и раздает изображения по HTTP для команды /link.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.updates: List[dict] = []
+        self.update_ids = count(1)
+        self.message_ids = count(1)
+        self.new_updates = asyncio.Event()
+        self.polling_started = asyncio.Event()
+        self.files: Dict[str, bytes] = {}
+        self.images: Dict[str, bytes] = {}
+        self.waiters: Dict[int, List[tuple]] = {}
+        self.callback_chats: Dict[str, int] = {}
+        self.runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        self.app.router.add_get('/file/bot{token}/{path:.+}', self.handle_file)
+        self.app.router.add_get('/images/{name}', self.handle_image)
+
+    async def start(self, host: str, port: int):
+        """Запускает HTTP-сервер"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        """Останавливает HTTP-сервер"""
+        if self.runner:
+            await self.runner.cleanup()
+
+    # --- Действия виртуальных пользователей ---
+
+    def add_image(self, name: str, image_bytes: bytes):
+        """Публикует изображение по адресу /images/<name>"""
+        self.images[name] = image_bytes
+
+    def expect(self, chat_id: int, kind: str) -> asyncio.Future:
+        """Создает ожидание ответа бота: 'keyboard' или 'document'"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(chat_id, []).append((kind, future))
+        return future
+
+    def send_photo(self, chat_id: int, image_bytes: bytes, width: int, height: int):
+        """Имитирует отправку фото пользователем"""
+        file_id = f"photo_{next(self.update_ids)}"
+        self.files[file_id] = image_bytes
+        self._push_update({
+            'message': self._user_message(chat_id, photo=[{
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'width': width,
+                'height': height,
+                'file_size': len(image_bytes)
+            }])
+        })
+
+    def send_command(self, chat_id: int, text: str):
+        """Имитирует отправку команды пользователем"""
+        command = text.split()[0]
+        self._push_update({
+            'message': self._user_message(chat_id, text=text, entities=[{
+                'type': 'bot_command',
+                'offset': 0,
+                'length': len(command)
+            }])
+        })
+
+    def press_button(self, chat_id: int, message: dict, callback_data: str):
+        """Имитирует нажатие кнопки под сообщением бота"""
+        query_id = str(next(self.update_ids))
+        self.callback_chats[query_id] = chat_id
+        self._push_update({
+            'callback_query': {
+                'id': query_id,
+                'from': self._user(chat_id),
+                'chat_instance': str(chat_id),
+                'message': message,
+                'data': callback_data
+            }
+        })
+
+    def _user(self, chat_id: int) -> dict:
+        return {'id': chat_id, 'is_bot': False, 'first_name': f"User{chat_id}"}
+
+    def _user_message(self, chat_id: int, **fields) -> dict:
+        return {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': self._user(chat_id),
+            **fields
+        }
+
+    def _push_update(self, update: dict):
+        update['update_id'] = next(self.update_ids)
+        self.updates.append(update)
+        self.new_updates.set()
+
+    # --- Уведомление ожидающих сценариев ---
+
+    def _resolve(self, chat_id: int, kind: str, value):
+        """Завершает первое ожидание указанного типа для чата"""
+        for waiter in self.waiters.get(chat_id, []):
+            if waiter[0] == kind and not waiter[1].done():
+                waiter[1].set_result(value)
+                self.waiters[chat_id].remove(waiter)
+                return
+
+    def _fail(self, chat_id: int, text: str):
+        """Завершает все ожидания чата ошибкой"""
+        for _, future in self.waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_exception(BotApiError(text))
+
+    def _check_error(self, chat_id: int, text: Optional[str]):
+        if text and any(marker in text.lower() for marker in ERROR_MARKERS):
+            self._fail(chat_id, text)
+
+    # --- Обработчики HTTP ---
+
+    async def _read_params(self, request: web.Request) -> dict:
+        """Читает параметры запроса: JSON, urlencoded или multipart"""
+        if request.content_type == 'application/json':
+            return await request.json()
+
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, web.FileField):
+                params[key] = value.file.read()
+                continue
+            # Сложные параметры (например, reply_markup) передаются как JSON-строки
+            params[key] = json.loads(value) if value[:1] in ('{', '[') else value
+        return params
+
+    def _bot_message(self, chat_id: int, **fields) -> dict:
+        return {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            **{key: value for key, value in fields.items() if value is not None}
+        }
+
+    def _on_text(self, chat_id: int, message: dict):
+        """Отслеживает клавиатуры и сообщения об ошибках в ответах бота"""
+        if message.get('reply_markup', {}).get('inline_keyboard'):
+            self._resolve(chat_id, 'keyboard', message)
+        else:
+            self._check_error(chat_id, message.get('text'))
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        if request.match_info['token'] != self.token:
+            return web.json_response({'ok': False, 'error_code': 401, 'description': 'Unauthorized'}, status=401)
+
+        method = request.match_info['method'].lower()
+        params = await self._read_params(request)
+
+        if method == 'getupdates':
+            result = await self._get_updates(params)
+        elif method == 'getme':
+            result = BOT_USER
+        elif method == 'getfile':
+            file_id = params['file_id']
+            result = {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_size': len(self.files[file_id]),
+                'file_path': f"photos/{file_id}.jpg"
+            }
+        elif method == 'sendmessage':
+            chat_id = int(params['chat_id'])
+            result = self._bot_message(chat_id, text=params.get('text'), reply_markup=params.get('reply_markup'))
+            self._on_text(chat_id, result)
+        elif method == 'editmessagetext':
+            chat_id = int(params['chat_id'])
+            result = self._bot_message(chat_id, text=params.get('text'), reply_markup=params.get('reply_markup'))
+            result['message_id'] = int(params['message_id'])
+            self._on_text(chat_id, result)
+        elif method == 'senddocument':
+            chat_id = int(params['chat_id'])
+            document = params.get('document') or b''
+            result = self._bot_message(chat_id, caption=params.get('caption'), document={
+                'file_id': f"document_{next(self.update_ids)}",
+                'file_unique_id': f"document_{next(self.update_ids)}",
+                'file_name': 'processed_image.jpg',
+                'file_size': len(document)
+            })
+            self._resolve(chat_id, 'document', result)
+        elif method == 'answercallbackquery':
+            chat_id = self.callback_chats.pop(str(params.get('callback_query_id')), None)
+            if chat_id is not None:
+                self._check_error(chat_id, params.get('text'))
+            result = True
+        else:
+            # deleteMessage, deleteWebhook и прочие методы просто подтверждаем
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, params: dict) -> list:
+        """Отдает обновления с поддержкой offset и long polling"""
+        self.polling_started.set()
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+
+        self.updates = [update for update in self.updates if update['update_id'] >= offset]
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        limit = int(params.get('limit') or 100)
+        return self.updates[:limit]
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        file_id = request.match_info['path'].rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        if file_id not in self.files:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.files[file_id], content_type='image/jpeg')
+
+    async def handle_image(self, request: web.Request) -> web.Response:
+        name = request.match_info['name']
+        if name not in self.images:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.images[name], content_type='image/jpeg')
@@ -0,0 +1,255 @@
+"""Сквозной нагрузочный тест бота на локальной замене Telegram Bot API.
+
+Запускает бота (src/main.py), воркеры (src/worker.py) и, по желанию, веб-приложение
+как отдельные процессы, направляет их на FakeTelegramServer и имитирует N
+пользователей, которые присылают фото, ссылки (/link) и загружают файлы через
+веб-интерфейс. В конце печатает перцентили времени до появления клавиатуры и от
+нажатия кнопки до получения документа, долю ошибок и пропускную способность.
+
+Пример запуска из корня репозитория:
+    PYTHONPATH=. python loadtest/harness.py --users 20 --iterations 5 --workers 4
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+import aiohttp
+from cryptography.fernet import Fernet
+from src.utils.token_manager import TokenManager
+from loadtest.fake_telegram import FakeTelegramServer
+from loadtest.images import make_test_image
+
+BOT_TOKEN = '123456:LOADTEST'
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@dataclass
+class FlowResult:
+    scenario: str
+    time_to_keyboard: Optional[float] = None
+    tap_to_document: Optional[float] = None
+    error: Optional[str] = None
+
+def percentile(values: List[float], p: float) -> float:
+    """Вычисляет перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+async def wait_keyboard_and_document(
+    server: FakeTelegramServer,
+    chat_id: int,
+    keyboard: asyncio.Future,
+    started_at: float,
+    result: FlowResult,
+    timeout: float
+):
+    """Ждет клавиатуру, нажимает первую кнопку и ждет обработанный документ"""
+    message = await asyncio.wait_for(keyboard, timeout)
+    result.time_to_keyboard = time.monotonic() - started_at
+
+    button = message['reply_markup']['inline_keyboard'][0][0]
+    document = server.expect(chat_id, 'document')
+    tapped_at = time.monotonic()
+    server.press_button(chat_id, message, button['callback_data'])
+    await asyncio.wait_for(document, timeout)
+    result.tap_to_document = time.monotonic() - tapped_at
+
+async def run_flow(
+    scenario: str,
+    server: FakeTelegramServer,
+    session: aiohttp.ClientSession,
+    chat_id: int,
+    image: tuple,
+    args: argparse.Namespace,
+    token_manager
+) -> FlowResult:
+    """Проходит один сценарий пользователя от отправки изображения до документа"""
+    image_bytes, width, height, image_name = image
+    result = FlowResult(scenario=scenario)
+    keyboard = server.expect(chat_id, 'keyboard')
+    started_at = time.monotonic()
+    try:
+        if scenario == 'photo':
+            server.send_photo(chat_id, image_bytes, width, height)
+        elif scenario == 'link':
+            server.send_command(chat_id, f"/link {args.api_url}/images/{image_name}")
+        else:
+            form = aiohttp.FormData()
+            form.add_field('file', image_bytes, filename='upload.jpg', content_type='image/jpeg')
+            token = token_manager.create_token(chat_id)
+            async with session.post(f"{args.webapp_url}/upload", params={'token': token}, data=form) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Веб-приложение ответило {response.status}")
+
+        await wait_keyboard_and_document(server, chat_id, keyboard, started_at, result, args.timeout)
+    except asyncio.TimeoutError:
+        result.error = 'timeout'
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    finally:
+        server.waiters.pop(chat_id, None)
+    return result
+
+async def run_user(
+    index: int,
+    scenarios: List[str],
+    server: FakeTelegramServer,
+    session: aiohttp.ClientSession,
+    images: List[tuple],
+    args: argparse.Namespace,
+    token_manager
+) -> List[FlowResult]:
+    """Имитирует одного пользователя, который последовательно проходит сценарии"""
+    chat_id = 100000 + index
+    results = []
+    for iteration in range(args.iterations):
+        scenario = scenarios[(index + iteration) % len(scenarios)]
+        image = images[(index + iteration) % len(images)]
+        results.append(await run_flow(scenario, server, session, chat_id, image, args, token_manager))
+        if args.think_time:
+            await asyncio.sleep(random.uniform(0, args.think_time))
+    return results
+
+def print_report(results: List[FlowResult], elapsed: float):
+    """Печатает сводку по сценариям и в целом"""
+    print(f"\n{'сценарий':<10}{'всего':>7}{'ошибки':>8}{'%ош':>7}"
+          f"{'кл p50':>9}{'кл p95':>9}{'кл p99':>9}{'док p50':>9}{'док p95':>9}{'док p99':>9}")
+
+    groups = sorted({result.scenario for result in results}) + ['всего']
+    for group in groups:
+        selected = results if group == 'всего' else [r for r in results if r.scenario == group]
+        errors = [r for r in selected if r.error]
+        keyboard_times = [r.time_to_keyboard for r in selected if r.time_to_keyboard is not None]
+        document_times = [r.tap_to_document for r in selected if r.tap_to_document is not None]
+
+        line = f"{group:<10}{len(selected):>7}{len(errors):>8}{len(errors) / len(selected) * 100:>6.1f}%"
+        for values in (keyboard_times, document_times):
+            for p in (50, 95, 99):
+                line += f"{percentile(values, p):>8.2f}s" if values else f"{'-':>9}"
+        print(line)
+
+    completed = sum(1 for r in results if not r.error)
+    print(f"\nВремя теста: {elapsed:.1f}с, успешных сценариев: {completed}, "
+          f"пропускная способность: {completed / elapsed:.2f} сценариев/с")
+
+    error_counts = {}
+    for result in results:
+        if result.error:
+            error_counts[result.error] = error_counts.get(result.error, 0) + 1
+    for error, amount in sorted(error_counts.items(), key=lambda item: -item[1]):
+        print(f"  {amount} × {error}")
+
+def start_process(command: List[str], env: dict, log_path: str) -> subprocess.Popen:
+    """Запускает компонент системы, перенаправляя вывод в лог"""
+    log = open(log_path, 'w')
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+async def wait_for_webapp(session: aiohttp.ClientSession, url: str, timeout: float):
+    """Ждет, пока веб-приложение начнет отвечать"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Веб-приложение не запустилось")
+
+async def main(args: argparse.Namespace):
+    scenarios = args.scenarios.split(',')
+    temp_dir = tempfile.mkdtemp(prefix='images_reshaper_loadtest_')
+    args.api_url = f"http://{args.host}:{args.port}"
+    args.webapp_url = f"http://{args.host}:{args.webapp_port}"
+
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        PYTHONUNBUFFERED='1',
+        BOT_TOKEN=BOT_TOKEN,
+        TELEGRAM_API_URL=args.api_url,
+        ALLOWED_USERS='*',
+        TEMP_DIR=temp_dir,
+        WORKER_POLL_INTERVAL='0.05',
+        TOKEN_SECRET_KEY=Fernet.generate_key().decode()
+    )
+    # Токены для веб-приложения создаем тем же ключом, что и у запущенных процессов
+    os.environ.update(TOKEN_SECRET_KEY=env['TOKEN_SECRET_KEY'], TEMP_DIR=temp_dir)
+    token_manager = TokenManager()
+
+    server = FakeTelegramServer(BOT_TOKEN)
+    images = []
+    for index in range(args.images):
+        width, height = args.image_width, args.image_height
+        image_name = f"image_{index}.jpg"
+        image_bytes = make_test_image(width, height)
+        server.add_image(image_name, image_bytes)
+        images.append((image_bytes, width, height, image_name))
+    await server.start(args.host, args.port)
+
+    processes = [start_process([sys.executable, 'src/main.py'], env, os.path.join(temp_dir, 'bot.log'))]
+    for index in range(args.workers):
+        processes.append(start_process(
+            [sys.executable, 'src/worker.py'], env, os.path.join(temp_dir, f"worker_{index}.log")
+        ))
+    if 'webapp' in scenarios:
+        processes.append(start_process(
+            [sys.executable, '-m', 'uvicorn', 'src.webapp.main:app',
+             '--host', args.host, '--port', str(args.webapp_port)],
+            env, os.path.join(temp_dir, 'webapp.log')
+        ))
+
+    print(f"Логи процессов: {temp_dir}")
+    try:
+        async with aiohttp.ClientSession() as session:
+            await asyncio.wait_for(server.polling_started.wait(), args.startup_timeout)
+            if 'webapp' in scenarios:
+                await wait_for_webapp(session, args.webapp_url, args.startup_timeout)
+
+            started_at = time.monotonic()
+            per_user = await asyncio.gather(*[
+                run_user(index, scenarios, server, session, images, args, token_manager)
+                for index in range(args.users)
+            ])
+            elapsed = time.monotonic() - started_at
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            # Ждем без блокировки цикла событий: воркеры при остановке еще обращаются к Bot API
+            try:
+                await asyncio.to_thread(process.wait, timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await server.stop()
+
+    print_report([result for results in per_user for result in results], elapsed)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10, help='Количество одновременных пользователей')
+    parser.add_argument('--iterations', type=int, default=3, help='Сценариев на пользователя')
+    parser.add_argument('--workers', type=int, default=2, help='Количество процессов-воркеров')
+    parser.add_argument('--scenarios', default='photo,link,webapp',
+                        help='Сценарии через запятую: photo, link, webapp')
+    parser.add_argument('--images', type=int, default=3, help='Количество разных тестовых изображений')
+    parser.add_argument('--image-width', type=int, default=2400)
+    parser.add_argument('--image-height', type=int, default=1600)
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='Максимальная пауза пользователя между сценариями (в секундах)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Таймаут одного шага сценария')
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081, help='Порт локального Bot API')
+    parser.add_argument('--webapp-port', type=int, default=8001, help='Порт веб-приложения')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
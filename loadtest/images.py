@@ -0,0 +1,16 @@
+"""Тестовые изображения для нагрузочного теста и проверки памяти.
+
+Модуль зависит только от Pillow, поэтому его можно импортировать из тестов,
+не подтягивая зависимости нагрузочного стенда.
+"""
+import io
+import os
+from PIL import Image
+
+def make_test_image(width: int, height: int) -> bytes:
+    """Создает JPEG с градиентом и шумом, который не проходит в лимит без сжатия"""
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    output = io.BytesIO()
+    Image.blend(gradient, noise, 0.3).save(output, format='JPEG', quality=95)
+    return output.getvalue()
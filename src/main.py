@@ -1,15 +1,16 @@
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from src.image_processor import process_image, process_image_from_link
-from src.utils.image_processor import get_image_dimensions, calculate_resize_options, process_image_bytes
+from src.utils.image_processor import get_image_dimensions, calculate_resize_options
 from src.utils.token_manager import TokenManager
 from src.utils.storage import storage  # Добавляем импорт
+from src.utils.processing_queue import processing_queue
 import html
 import json
-import io
 import aiohttp
 
 # Загрузка переменных окружения
@@ -196,29 +197,26 @@ async def handle_resize_callback(update: Update, context: ContextTypes.DEFAULT_T
             await query.answer("Изображение не найдено, попробуйте загрузить его снова.")
             return
         
-        # Обрабатываем изображение с новыми размерами
-        result = await process_image_bytes(
+        # Ставим задачу в очередь, результат отправит воркер. Запись файла и ожидание
+        # блокировки SQLite выполняем в отдельном потоке, чтобы не задерживать другие обновления
+        await asyncio.to_thread(
+            processing_queue.submit,
             pending_image['bytes'],
-            target_width=data['width'],
-            target_height=data['height']
-        )
-        
-        # Отправляем обработанное изображение
-        await query.message.reply_document(
-            document=io.BytesIO(result.bytes),
-            filename="processed_image.jpg",
-            caption=f"Размер изображения: {data['width']}x{data['height']}\n"
-                   f"Исходный размер файла: {result.original_size / 1024:.1f}KB\n"
-                   f"Конечный размер файла: {result.final_size / 1024:.1f}KB\n"
-                   f"Качество: {result.quality}%"
+            chat_id=query.message.chat_id,
+            width=data['width'],
+            height=data['height'],
+            message_id=query.message.message_id
         )
         
         # Очищаем сохраненное изображение из контекста телеграма, если оно там было
         if 'pending_image' in context.user_data:
             del context.user_data['pending_image']
         
-        # Удаляем сообщение с кнопками
-        await query.message.delete()
+        # Убираем кнопки, пока изображение обрабатывается
+        await query.answer()
+        await query.edit_message_text(
+            f"Изображение поставлено в очередь на обработку ({data['width']}x{data['height']})..."
+        )
         
     except Exception as e:
         logging.error(f"Ошибка при обработке callback: {e}")
@@ -253,10 +251,18 @@ async def handle_load(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cleanup_old_files(context: ContextTypes.DEFAULT_TYPE):
     """Периодически очищает старые файлы"""
     storage.cleanup_old_files()
+    await asyncio.to_thread(processing_queue.cleanup_old_jobs)
 
 def main():
     # Инициализация бота
-    application = Application.builder().token(os.getenv('BOT_TOKEN')).build()
+    builder = Application.builder().token(os.getenv('BOT_TOKEN'))
+    
+    # Позволяет направить бота на локальный стенд Bot API (например, для нагрузочного теста)
+    api_url = os.getenv('TELEGRAM_API_URL')
+    if api_url:
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot")
+    
+    application = builder.build()
     
     # Добавление обработчиков
     application.add_handler(CommandHandler("start", start))
@@ -0,0 +1,74 @@
+import io
+from typing import Optional
+
+class BufferReader(io.RawIOBase):
+    """Файловый интерфейс только для чтения поверх буфера без копирования.
+
+    Принимает bytes, bytearray, memoryview или mmap; в отличие от io.BytesIO
+    не копирует буфер целиком, а отдает данные по частям по мере чтения.
+    """
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self.view[self.position:self.position + len(target)]
+        size = len(chunk)
+        target[:size] = chunk
+        self.position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        # Освобождаем буфер, иначе mmap нельзя будет закрыть
+        self.view.release()
+        super().close()
+
+class BudgetWriter(io.RawIOBase):
+    """Приемник для кодировщика, который хранит данные, только пока они укладываются в лимит.
+
+    Размер считается всегда, а превысивший лимит результат сразу отбрасывается,
+    поэтому неподходящее кодирование не занимает память.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self.buffer: Optional[io.BytesIO] = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        size = len(data)
+        self.size += size
+        if self.buffer is not None:
+            if self.size > self.limit:
+                self.buffer = None
+            else:
+                self.buffer.write(data)
+        return size
+
+    def tell(self) -> int:
+        return self.size
+
+    def getvalue(self) -> Optional[bytes]:
+        """Возвращает закодированные данные или None, если лимит превышен"""
+        return self.buffer.getvalue() if self.buffer is not None else None
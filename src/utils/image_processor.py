@@ -1,12 +1,14 @@
 from PIL import Image
-import io
 import os
 import aiohttp
 from telegram import File
 import logging
 from dataclasses import dataclass
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 import asyncio
+from src.utils.load_monitor import ProcessingProfile, load_monitor
+from src.utils.size_optimizer import optimize_jpeg, MIN_QUALITY
+from src.utils.buffers import BufferReader
 
 @dataclass
 class ProcessingResult:
@@ -14,76 +16,102 @@ class ProcessingResult:
     original_size: int
     final_size: int
     quality: int
-
-async def check_quality(img: Image.Image, quality: int) -> Tuple[int, int, bytes]:
-    """Асинхронно проверяет размер изображения при заданном качестве"""
-    output = io.BytesIO()
-    img.save(output, format='JPEG', quality=quality, optimize=True)
-    size = output.tell()
-    return quality, size, output.getvalue()
+    profile: str = 'full'
+    width: Optional[int] = None
+    height: Optional[int] = None
+    scale: float = 1.0
 
 async def process_image_bytes(
     image_bytes: bytes,
     target_width: int = None,
-    target_height: int = None
+    target_height: int = None,
+    profile: ProcessingProfile = None,
+    queue_depth: int = None,
+    queue_wait: float = None
+) -> ProcessingResult:
+    """Обрабатывает изображение, оптимизируя размер файла.
+
+    Если профиль не передан, он выбирается по текущей нагрузке: под нагрузкой
+    используются более дешевые настройки ценой чуть большего размера файла.
+    queue_wait — сколько задача ждала в очереди (в секундах), если она пришла из очереди.
+    image_bytes может быть любым буфером (bytes, bytearray, memoryview, mmap),
+    он читается без копирования.
+    """
+    if queue_wait is not None:
+        load_monitor.record_wait(queue_wait)
+    if profile is None:
+        profile = load_monitor.select_profile(queue_depth)
+
+    # Обработка идет в отдельном потоке: цикл событий не блокируется, а одновременные
+    # задачи действительно выполняются параллельно и видны монитору нагрузки
+    with load_monitor.track(profile):
+        return await asyncio.to_thread(_process_with_profile, image_bytes, target_width, target_height, profile)
+
+def _process_with_profile(
+    image_bytes: bytes,
+    target_width: int,
+    target_height: int,
+    profile: ProcessingProfile
 ) -> ProcessingResult:
-    """Обрабатывает изображение, оптимизируя размер файла"""
+    """Обрабатывает изображение с настройками указанного профиля"""
     max_file_size = int(os.getenv('MAX_PROCESSED_FILE_SIZE', 400 * 1024))
     original_size = len(image_bytes)
     
     # Если исходный размер уже подходящий, возвращаем как есть
     if original_size <= max_file_size:
         return ProcessingResult(
-            bytes=image_bytes,
+            # Копируем только небольшой исходник, чтобы результат не зависел от чужого буфера
+            bytes=image_bytes if isinstance(image_bytes, bytes) else bytes(image_bytes),
             original_size=original_size,
             final_size=original_size,
-            quality=100
+            quality=100,
+            profile=profile.name
         )
     
-    with Image.open(io.BytesIO(image_bytes)) as img:
+    with BufferReader(image_bytes) as reader, Image.open(reader) as img:
+        # Запрос "оригинального размера": разрешение важнее, чем сильное сжатие
+        keep_resolution = not (target_width and target_height) or (target_width, target_height) == img.size
+
+        # Для JPEG декодируем сразу в уменьшенном масштабе (не меньше целевого размера)
+        if profile.draft and not keep_resolution:
+            img.draft('RGB', (target_width, target_height))
+
         if img.mode in ('RGBA', 'P'):
             img = img.convert('RGB')
         
         # Изменяем размер, если указаны целевые размеры
-        if target_width and target_height:
-            img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-            
-            # После изменения размера пробуем сохранить с максимальным качеством
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=100, optimize=True)
-            size = output.tell()
-            
-            # Если после изменения размера файл уже подходящий, возвращаем его
-            if size <= max_file_size:
-                return ProcessingResult(
-                    bytes=output.getvalue(),
-                    original_size=original_size,
-                    final_size=size,
-                    quality=100
-                )
-        
-        # Если нужно уменьшить размер, проверяем разные уровни качества
-        control_points = [95, 80, 60, 40, 20, 5]
-        tasks = [check_quality(img, q) for q in control_points]
-        quality_sizes = await asyncio.gather(*tasks)
-        quality_sizes.sort(reverse=True)  # Сортируем по качеству (от большего к меньшему)
+        if target_width and target_height and (target_width, target_height) != img.size:
+            img = img.resize((target_width, target_height), profile.resample)
         
-        # Находим первое качество, дающее подходящий размер
-        for quality, size, bytes_data in quality_sizes:
-            if size <= max_file_size:
-                return ProcessingResult(
-                    bytes=bytes_data,
-                    original_size=original_size,
-                    final_size=size,
-                    quality=quality
-                )
-        
-        # Если не нашли подходящее качество, возвращаем минимальное
+        # Подбираем масштаб и качество так, чтобы файл уложился в лимит; для запроса
+        # "оригинального размера" допускается лишь небольшое уменьшение
+        if keep_resolution:
+            quality_floor = int(os.getenv('MIN_JPEG_QUALITY', 60))
+            min_scale = float(os.getenv('MIN_RESOLUTION_SCALE', 0.7))
+        else:
+            quality_floor, min_scale = MIN_QUALITY, 0.01
+        optimized = optimize_jpeg(
+            img,
+            max_file_size,
+            resample=profile.resample,
+            optimize=profile.optimize,
+            max_encodes=profile.max_encodes,
+            quality_floor=quality_floor,
+            min_scale=min_scale
+        )
+        logging.info(
+            f"Оптимизация: {optimized.width}x{optimized.height} (масштаб {optimized.scale:.2f}), "
+            f"качество={optimized.quality}, размер={len(optimized.bytes)}, кодирований={optimized.encodes}"
+        )
         return ProcessingResult(
-            bytes=quality_sizes[-1][2],  # bytes при минимальном качестве
+            bytes=optimized.bytes,
             original_size=original_size,
-            final_size=quality_sizes[-1][1],  # size при минимальном качестве
-            quality=quality_sizes[-1][0]  # минимальное качество
+            final_size=len(optimized.bytes),
+            quality=optimized.quality,
+            profile=profile.name,
+            width=optimized.width,
+            height=optimized.height,
+            scale=optimized.scale
         )
 
 async def process_image_file(file: File) -> Tuple[str, ProcessingResult]:
@@ -132,8 +160,8 @@ async def process_image_from_url(url: str) -> Tuple[str, ProcessingResult]:
         raise Exception(f"Ошибка при обработке изображения: {str(e)}")
 
 def get_image_dimensions(image_bytes: bytes) -> Tuple[int, int]:
-    """Получает размеры изображения из байтов"""
-    with Image.open(io.BytesIO(image_bytes)) as img:
+    """Получает размеры изображения из байтов (читает только заголовок, без копирования)"""
+    with BufferReader(image_bytes) as reader, Image.open(reader) as img:
         return img.size
 
 def calculate_resize_options(width: int, height: int) -> list:
@@ -0,0 +1,115 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+from PIL import Image
+
+@dataclass(frozen=True)
+class ProcessingProfile:
+    name: str
+    description: str
+    resample: int
+    max_encodes: int
+    optimize: bool
+    draft: bool
+
+# Профили обработки от самого качественного к самому дешевому
+PROFILES = (
+    ProcessingProfile(
+        name='full',
+        description='полный',
+        resample=Image.Resampling.LANCZOS,
+        max_encodes=6,
+        optimize=True,
+        draft=False
+    ),
+    ProcessingProfile(
+        name='reduced',
+        description='облегченный',
+        resample=Image.Resampling.BICUBIC,
+        max_encodes=4,
+        optimize=True,
+        draft=True
+    ),
+    ProcessingProfile(
+        name='minimal',
+        description='экономный',
+        resample=Image.Resampling.BILINEAR,
+        max_encodes=3,
+        optimize=False,
+        draft=True
+    ),
+)
+
+def profile_description(name: str) -> str:
+    """Возвращает описание профиля для пользователя по его внутреннему имени"""
+    for profile in PROFILES:
+        if profile.name == name:
+            return profile.description
+    return name
+
+class LoadMonitor:
+    def __init__(self):
+        # Пороги глубины очереди для перехода на более дешевые профили
+        self.reduced_depth = int(os.getenv('LOAD_REDUCED_QUEUE_DEPTH', 3))
+        self.minimal_depth = int(os.getenv('LOAD_MINIMAL_QUEUE_DEPTH', 6))
+        # Целевое время ожидания задачи в очереди (в секундах). Время самой обработки
+        # зависит от размера изображения, а не от нагрузки, поэтому оно здесь не учитывается
+        self.wait_slo = float(os.getenv('LOAD_QUEUE_WAIT_SLO', 5))
+        # Коэффициент сглаживания для скользящего среднего времени ожидания
+        self.alpha = 0.3
+
+        self.in_flight = 0
+        self.avg_wait = 0.0
+        self.level = 0
+
+    def record_wait(self, seconds: float):
+        """Учитывает, сколько задача ждала в очереди до начала обработки"""
+        self.avg_wait = self.alpha * seconds + (1 - self.alpha) * self.avg_wait
+
+    def _target_level(self, depth: int) -> int:
+        """Определяет уровень деградации по глубине очереди и времени ожидания в ней"""
+        if depth >= self.minimal_depth or self.avg_wait > 2 * self.wait_slo:
+            return 2
+        if depth >= self.reduced_depth or self.avg_wait > self.wait_slo:
+            return 1
+        return 0
+
+    def select_profile(self, queue_depth: Optional[int] = None) -> ProcessingProfile:
+        """Выбирает профиль обработки в зависимости от текущей нагрузки"""
+        # Без явной очереди нагрузкой считаем задачи, которые уже обрабатываются параллельно
+        depth = self.in_flight if queue_depth is None else queue_depth
+        target = self._target_level(depth)
+
+        if target > self.level:
+            self.level = target
+        elif target < self.level:
+            # Возвращаемся на уровень выше только с запасом, чтобы не "дребезжать"
+            # на границе порога
+            threshold = self.reduced_depth if self.level == 1 else self.minimal_depth
+            calm_depth = depth <= threshold // 2
+            calm_wait = self.avg_wait < 0.8 * self.wait_slo
+            if calm_depth and calm_wait:
+                self.level -= 1
+
+        return PROFILES[self.level]
+
+    @contextmanager
+    def track(self, profile: ProcessingProfile):
+        """Учитывает обработку изображения в метриках нагрузки"""
+        self.in_flight += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started_at
+            self.in_flight -= 1
+            logging.info(
+                f"Обработка изображения: профиль={profile.name}, время={elapsed:.2f}с, "
+                f"среднее ожидание в очереди={self.avg_wait:.2f}с, в работе={self.in_flight}"
+            )
+
+# Создаем глобальный экземпляр монитора нагрузки
+load_monitor = LoadMonitor()
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# Результаты ProcessingQueue.fail
+FAIL_RETRY = 'retry'          # задача возвращена в очередь для повтора
+FAIL_FINAL = 'failed'         # попытки исчерпаны, задача завершена с ошибкой
+FAIL_NOT_OWNER = 'not_owner'  # задача уже принадлежит другому воркеру или завершена
+
+@dataclass
+class ProcessingJob:
+    id: int
+    chat_id: int
+    message_id: Optional[int]
+    width: int
+    height: int
+    image_path: str
+    attempts: int
+    max_attempts: int
+    created_at: float
+
+class ProcessingQueue:
+    """Надежная очередь задач обработки на SQLite в общем томе /app/temp.
+
+    Бот ставит задачи в очередь, воркеры забирают их с арендой (lease):
+    если воркер упал, по истечении аренды задачу заберет другой воркер.
+    """
+
+    def __init__(self):
+        self.jobs_dir = Path(os.getenv('TEMP_DIR', '/app/temp')) / 'jobs'
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.jobs_dir / 'jobs.sqlite3'
+        self.max_attempts = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+        self.retry_delay = float(os.getenv('JOB_RETRY_DELAY', 5))
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение в режиме autocommit, транзакции управляются вручную"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Создает таблицу задач, если ее еще нет"""
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    image_path TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_until REAL,
+                    available_at REAL NOT NULL,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        finally:
+            conn.close()
+
+    def submit(
+        self,
+        image_bytes: bytes,
+        chat_id: int,
+        width: int,
+        height: int,
+        message_id: int = None
+    ) -> int:
+        """Ставит задачу в очередь и возвращает ее идентификатор"""
+        # Сначала сохраняем изображение, чтобы воркер никогда не увидел задачу без файла
+        image_path = self.jobs_dir / f"{time.time_ns()}_{chat_id}.img"
+        tmp_path = image_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, image_path)
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                INSERT INTO jobs (chat_id, message_id, width, height, image_path,
+                                  max_attempts, available_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (chat_id, message_id, width, height, str(image_path),
+                 self.max_attempts, now, now, now)
+            )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[ProcessingJob]:
+        """Забирает следующую задачу в аренду: новую или с истекшей арендой"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE (status = 'queued' AND available_at <= ?)
+                   OR (status = 'running' AND lease_until < ?)
+                ORDER BY id
+                LIMIT 1
+                """,
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                """
+                UPDATE jobs
+                SET status = 'running', worker_id = ?, lease_until = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return ProcessingJob(
+            id=row['id'],
+            chat_id=row['chat_id'],
+            message_id=row['message_id'],
+            width=row['width'],
+            height=row['height'],
+            image_path=row['image_path'],
+            attempts=row['attempts'] + 1,
+            max_attempts=row['max_attempts'],
+            created_at=row['created_at']
+        )
+
+    def extend_lease(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Продлевает аренду; возвращает False, если задачу уже забрал другой воркер"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET lease_until = ?, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+                """,
+                (now + lease_seconds, now, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, job_id: int, worker_id: str, result: dict) -> bool:
+        """Отмечает задачу выполненной; возвращает False, если задача уже не принадлежит воркеру"""
+        return self._finish(job_id, worker_id, 'done', result=json.dumps(result))
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> str:
+        """Возвращает задачу в очередь для повтора или завершает ее, если попытки исчерпаны.
+
+        Возвращает FAIL_RETRY, FAIL_FINAL или FAIL_NOT_OWNER.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                """
+                SELECT attempts, max_attempts FROM jobs
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+                """,
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return FAIL_NOT_OWNER
+            if row['attempts'] < row['max_attempts']:
+                # Откладываем повтор, увеличивая задержку с каждой попыткой
+                conn.execute(
+                    """
+                    UPDATE jobs
+                    SET status = 'queued', worker_id = NULL, lease_until = NULL,
+                        available_at = ?, error = ?, updated_at = ?
+                    WHERE id = ? AND worker_id = ? AND status = 'running'
+                    """,
+                    (now + self.retry_delay * row['attempts'], error, now, job_id, worker_id)
+                )
+                return FAIL_RETRY
+        finally:
+            conn.close()
+
+        if not self._finish(job_id, worker_id, 'failed', error=error):
+            return FAIL_NOT_OWNER
+        return FAIL_FINAL
+
+    def _finish(self, job_id: int, worker_id: str, status: str, result: str = None, error: str = None) -> bool:
+        """Переводит задачу в конечный статус и удаляет файл изображения"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT image_path FROM jobs WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            cursor = conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, result = ?, error = COALESCE(?, error),
+                    lease_until = NULL, updated_at = ?
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+                """,
+                (status, result, error, time.time(), job_id, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return False
+        finally:
+            conn.close()
+
+        Path(row['image_path']).unlink(missing_ok=True)
+        return True
+
+    def backlog(self) -> int:
+        """Возвращает количество задач, ожидающих свободного воркера"""
+        conn = self._connect()
+        try:
+            # Задачи в работе не считаем: они уже заняты воркерами и не говорят о перегрузке
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND available_at <= ?",
+                (time.time(),)
+            ).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+
+    def cleanup_old_jobs(self, max_age_hours: int = 24):
+        """Удаляет записи о завершенных задачах"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - max_age_hours * 3600,)
+            )
+        finally:
+            conn.close()
+
+# Создаем глобальный экземпляр очереди обработки
+processing_queue = ProcessingQueue()
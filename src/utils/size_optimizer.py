@@ -0,0 +1,207 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from src.utils.buffers import BudgetWriter
+
+MIN_QUALITY = 5
+MAX_QUALITY = 95
+# Наклон ln(байт на пиксель) по качеству, пока есть только одна проба
+DEFAULT_SLOPE = 0.03
+# Запас по размеру при прогнозе, чтобы реже промахиваться мимо лимита
+BUDGET_MARGIN = 0.97
+# Доля лимита, ниже которой уменьшенный результат считается слишком консервативным,
+# и сколько дополнительных кодирований можно потратить на его уточнение
+UNDERFILL = 0.5
+MAX_REFINEMENTS = 2
+
+@dataclass
+class OptimizationResult:
+    bytes: bytes
+    quality: int
+    scale: float
+    width: int
+    height: int
+    encodes: int
+
+class SizeModel:
+    """Модель размера JPEG: ln(байт на пиксель) кусочно-линейно зависит от качества.
+
+    Пробы с разными масштабами приводятся к байтам на пиксель; для масштабов
+    между пробами прогноз интерполируется.
+    """
+
+    def __init__(self):
+        self.probes: Dict[float, Dict[int, float]] = {}
+
+    def add(self, scale: float, quality: int, size: int, pixels: int):
+        self.probes.setdefault(scale, {})[quality] = math.log(size / pixels)
+
+    def _log_bpp_at(self, quality: int, scale: float) -> float:
+        """Прогноз по пробам, сделанным на одном масштабе"""
+        points = sorted(self.probes[scale].items())
+        if len(points) == 1:
+            q0, value = points[0]
+            return value + DEFAULT_SLOPE * (quality - q0)
+
+        # Выбираем отрезок для интерполяции (или крайний отрезок для экстраполяции)
+        index = 1
+        while index < len(points) - 1 and points[index][0] < quality:
+            index += 1
+        (q0, v0), (q1, v1) = points[index - 1], points[index]
+        # Размер растет с качеством, поэтому не даем наклону стать неположительным
+        slope = max((v1 - v0) / (q1 - q0), 0.001)
+        return v0 + slope * (quality - q0)
+
+    def log_bpp(self, quality: int, scale: float) -> float:
+        """Прогнозирует ln(байт на пиксель) при заданном качестве и масштабе"""
+        if scale in self.probes:
+            return self._log_bpp_at(quality, scale)
+
+        # Интерполируем между соседними масштабами по ln(масштаба), за пределами — берем крайний
+        lower = [probed for probed in self.probes if probed < scale]
+        upper = [probed for probed in self.probes if probed > scale]
+        if not lower or not upper:
+            return self._log_bpp_at(quality, max(lower) if lower else min(upper))
+        s0, s1 = max(lower), min(upper)
+        weight = math.log(scale / s0) / math.log(s1 / s0)
+        return (1 - weight) * self._log_bpp_at(quality, s0) + weight * self._log_bpp_at(quality, s1)
+
+    def max_quality(self, budget: int, scale: float, pixels: int, low: int, high: int) -> Optional[int]:
+        """Находит наибольшее качество, при котором прогноз укладывается в лимит"""
+        limit = math.log(budget * BUDGET_MARGIN / pixels)
+        if self.log_bpp(low, scale) > limit:
+            return None
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.log_bpp(middle, scale) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def scale_for(self, budget: int, quality: int, width: int, height: int) -> float:
+        """Находит масштаб, при котором изображение с заданным качеством уложится в лимит"""
+        # Байты на пиксель зависят от масштаба, поэтому уточняем оценку несколькими итерациями
+        scale = 1.0
+        for _ in range(5):
+            bpp = math.exp(self.log_bpp(quality, scale))
+            scale = min(1.0, math.sqrt(budget * BUDGET_MARGIN / (bpp * width * height)))
+        return scale
+
+def _candidate_key(scale: float, quality: int, quality_floor: int) -> tuple:
+    """Порядок кандидатов: сначала качество не ниже порога, затем разрешение, затем качество"""
+    return (quality >= quality_floor, scale, quality)
+
+def optimize_jpeg(
+    img: Image.Image,
+    max_file_size: int,
+    resample: int,
+    optimize: bool = True,
+    max_encodes: int = 6,
+    quality_floor: int = MIN_QUALITY,
+    min_scale: float = 0.01
+) -> OptimizationResult:
+    """Подбирает масштаб и качество JPEG так, чтобы файл гарантированно уложился в лимит.
+
+    Пока качество не опускается ниже quality_floor, разрешение сохраняется; иначе
+    изображение немного уменьшается, что обычно выглядит лучше сильного сжатия.
+    Уменьшение ограничено min_scale: дальше вместо разрешения снижается качество.
+    Меньше min_scale изображение становится, только если даже минимальное качество
+    не укладывается в лимит.
+    Размер прогнозируется по модели, построенной на уже сделанных кодированиях,
+    поэтому обычно хватает двух-трех кодирований. В памяти хранится только лучший
+    кандидат, а кодирования, превысившие лимит, отбрасываются еще во время записи.
+    """
+    width, height = img.size
+    model = SizeModel()
+    best: Optional[OptimizationResult] = None
+    encodes = 0
+    # Фактические размеры всех кодирований по точкам (масштаб, качество)
+    sizes: Dict[Tuple[float, int], int] = {}
+    scaled = (1.0, img)
+
+    def encode(scale: float, quality: int) -> Optional[OptimizationResult]:
+        """Кодирует изображение; возвращает None, если файл не уложился в лимит"""
+        nonlocal encodes, scaled
+        if scaled[0] != scale:
+            # Сначала отпускаем прошлую уменьшенную копию, чтобы не держать две сразу
+            scaled = None
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            scaled = (scale, img if scale == 1.0 else img.resize(size, resample))
+        output = BudgetWriter(max_file_size)
+        scaled[1].save(output, format='JPEG', quality=quality, optimize=optimize)
+        encodes += 1
+        sizes[(scale, quality)] = output.size
+        model.add(scale, quality, output.size, scaled[1].width * scaled[1].height)
+        data = output.getvalue()
+        if data is None:
+            return None
+        return OptimizationResult(
+            bytes=data,
+            quality=quality,
+            scale=scale,
+            width=scaled[1].width,
+            height=scaled[1].height,
+            encodes=encodes
+        )
+
+    def next_point() -> Tuple[float, int]:
+        """Выбирает следующую точку по модели"""
+        quality = model.max_quality(max_file_size, 1.0, width * height, MIN_QUALITY, MAX_QUALITY)
+        if quality is not None and quality >= quality_floor:
+            return 1.0, quality
+        # Одной пробы мало, чтобы оценить уменьшение: сначала уточняем модель на пороге качества
+        if len(model.probes[1.0]) < 2:
+            return 1.0, quality_floor
+        scale = math.floor(model.scale_for(max_file_size, quality_floor, width, height) * 100) / 100
+        # Не уменьшаем сильнее допустимого: на min_scale качество может опуститься ниже порога
+        scale = max(scale, min_scale)
+        pixels = max(1, round(width * scale)) * max(1, round(height * scale))
+        quality = model.max_quality(max_file_size, scale, pixels, MIN_QUALITY, MAX_QUALITY)
+        return scale, quality if quality is not None else MIN_QUALITY
+
+    scale, quality = 1.0, MAX_QUALITY
+    best_key = None
+    encode_limit = max_encodes
+    while (scale, quality) not in sizes:
+        if encodes >= encode_limit:
+            # Уменьшенный результат, занимающий малую часть лимита, — это лишняя потеря
+            # разрешения: даем модели еще немного кодирований, чтобы ее исправить
+            underfilled = best is not None and best.scale < 1.0 and len(best.bytes) < max_file_size * UNDERFILL
+            if not underfilled or encodes >= encode_limit + MAX_REFINEMENTS:
+                break
+        # Первое уменьшение считается по пробам на масштабе 1 и обычно берет масштаб с запасом,
+        # поэтому после него всегда оставляем одно кодирование на уточнение
+        if scale < 1.0 and all(probed == 1.0 for probed in model.probes):
+            encode_limit = max(encode_limit, encodes + 2)
+        candidate = encode(scale, quality)
+        if candidate is not None and (best is None or _candidate_key(scale, quality, quality_floor) > best_key):
+            best = candidate
+            best_key = _candidate_key(scale, quality, quality_floor)
+        # Храним только лучший кандидат
+        candidate = None
+
+        scale, quality = next_point()
+        # Новая точка не лучше найденной (или лучше на единицу качества) — дальше искать незачем
+        if best is not None:
+            if _candidate_key(scale, quality, quality_floor) <= best_key:
+                break
+            if scale == best.scale and quality - best.quality < 2:
+                break
+
+    if best is not None:
+        best.encodes = encodes
+        return best
+
+    # Гарантия лимита: уменьшаем изображение по фактическому размеру, пока файл не уложится.
+    # Уже закодированная точка в лимит не уложилась, поэтому повторно ее не кодируем
+    while True:
+        if (scale, quality) not in sizes:
+            candidate = encode(scale, quality)
+            if candidate is not None:
+                candidate.encodes = encodes
+                return candidate
+        if round(width * scale) <= 1 and round(height * scale) <= 1:
+            raise ValueError("Лимит размера файла слишком мал для JPEG")
+        scale = round(scale * min(0.9, math.sqrt(max_file_size * BUDGET_MARGIN / sizes[(scale, quality)])), 4)
@@ -4,7 +4,7 @@ from pathlib import Path
 
 class ImageStorage:
     def __init__(self):
-        self.temp_dir = Path("/app/temp")
+        self.temp_dir = Path(os.getenv('TEMP_DIR', '/app/temp'))
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
     def _get_user_dir(self, user_id: int) -> Path:
@@ -69,7 +69,8 @@ class ImageStorage:
         current_time = time.time()
         
         for user_dir in self.temp_dir.iterdir():
-            if not user_dir.is_dir():
+            # Чистим только папки пользователей: рядом лежит очередь обработки (jobs)
+            if not user_dir.is_dir() or not user_dir.name.isdigit():
                 continue
                 
             # Проверяем время последнего изменения директории
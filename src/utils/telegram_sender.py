@@ -2,10 +2,23 @@ from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 import os
 import io
 import json
+import logging
+from src.utils.load_monitor import profile_description
+
+def create_bot() -> Bot:
+    """Создает бота; TELEGRAM_API_URL позволяет направить его на локальный стенд Bot API"""
+    api_url = os.getenv('TELEGRAM_API_URL')
+    if api_url:
+        return Bot(
+            token=os.getenv('BOT_TOKEN'),
+            base_url=f"{api_url}/bot",
+            base_file_url=f"{api_url}/file/bot"
+        )
+    return Bot(token=os.getenv('BOT_TOKEN'))
 
 async def send_processed_image_to_telegram(user_id: int, image_bytes: bytes):
     """Отправляет обработанное изображение пользователю в Telegram"""
-    bot = Bot(token=os.getenv('BOT_TOKEN'))
+    bot = create_bot()
     
     # Создаем объект файла из байтов
     file = io.BytesIO(image_bytes)
@@ -26,7 +39,7 @@ async def send_resize_options_to_telegram(
     resize_options: list
 ):
     """Отправляет варианты изменения размера в Telegram"""
-    bot = Bot(token=os.getenv('BOT_TOKEN'))
+    bot = create_bot()
     
     # Создаем клавиатуру с вариантами
     keyboard = []
@@ -49,4 +62,55 @@ async def send_resize_options_to_telegram(
         text=f"Изображение получено, его размеры: {width}x{height}.\n"
              "Как вы хотите преобразовать его под свой веб-сайт?",
         reply_markup=reply_markup
-    ) 
\ No newline at end of file
+    ) 
+
+async def send_processing_result_to_telegram(
+    chat_id: int,
+    result,
+    width: int,
+    height: int
+):
+    """Отправляет результат обработки пользователю"""
+    bot = create_bot()
+    
+    caption = (
+        f"Размер изображения: {result.width or width}x{result.height or height}\n"
+        f"Исходный размер файла: {result.original_size / 1024:.1f}KB\n"
+        f"Конечный размер файла: {result.final_size / 1024:.1f}KB\n"
+        f"Качество: {result.quality}%\n"
+        f"Профиль обработки: {profile_description(result.profile)}"
+    )
+    # Сообщаем, если ради лимита размера файла пришлось уменьшить разрешение
+    if result.scale < 1:
+        caption += (
+            f"\nРазрешение уменьшено до {result.scale * 100:.0f}% от {width}x{height}, "
+            f"чтобы уложиться в лимит без сильной потери качества"
+        )
+    
+    # Передаем bytes напрямую: обертка в BytesIO привела бы к лишней копии при отправке
+    await bot.send_document(
+        chat_id=chat_id,
+        document=result.bytes,
+        filename="processed_image.jpg",
+        caption=caption
+    )
+
+async def delete_resize_options_message(chat_id: int, message_id: int = None):
+    """Удаляет сообщение с вариантами размера; ошибки не критичны и только логируются"""
+    if not message_id:
+        return
+    bot = create_bot()
+    
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        logging.warning(f"Не удалось удалить сообщение {message_id} в чате {chat_id}: {e}")
+
+async def send_processing_error_to_telegram(chat_id: int):
+    """Сообщает пользователю, что изображение не удалось обработать"""
+    bot = create_bot()
+    
+    await bot.send_message(
+        chat_id=chat_id,
+        text="Произошла ошибка при обработке изображения, попробуйте загрузить его снова."
+    )
@@ -0,0 +1,153 @@
+import os
+import mmap
+import time
+import signal
+import socket
+import asyncio
+import logging
+from dotenv import load_dotenv
+from src.utils.image_processor import process_image_bytes
+from src.utils.processing_queue import processing_queue, ProcessingJob, FAIL_FINAL
+from src.utils.telegram_sender import (
+    send_processing_result_to_telegram,
+    send_processing_error_to_telegram,
+    delete_resize_options_message
+)
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+# Длительность аренды задачи и интервал опроса очереди (в секундах)
+LEASE_SECONDS = float(os.getenv('WORKER_LEASE_SECONDS', 60))
+POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 0.5))
+# Максимальная пауза между попытками отметить задачу выполненной (в секундах)
+COMPLETE_RETRY_MAX_DELAY = 5
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+async def keep_lease(job: ProcessingJob, lease_lost: asyncio.Event):
+    """Продлевает аренду задачи, пока она обрабатывается"""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        try:
+            extended = processing_queue.extend_lease(job.id, WORKER_ID, LEASE_SECONDS)
+        except Exception as e:
+            # Временная ошибка базы: аренда еще может быть действительна, пробуем снова
+            logging.error(f"Не удалось продлить аренду задачи {job.id}: {e}")
+            continue
+        if not extended:
+            logging.warning(f"Аренда задачи {job.id} потеряна")
+            lease_lost.set()
+            return
+
+async def complete_job(job: ProcessingJob, result, lease_lost: asyncio.Event):
+    """Фиксирует выполнение задачи.
+
+    Документ к этому моменту уже отправлен, поэтому попытки повторяются, пока задача
+    принадлежит воркеру: иначе после истечения аренды другой воркер отправил бы его снова.
+    """
+    attempt = 0
+    while not lease_lost.is_set():
+        attempt += 1
+        try:
+            completed = processing_queue.complete(job.id, WORKER_ID, {
+                'original_size': result.original_size,
+                'final_size': result.final_size,
+                'quality': result.quality,
+                'profile': result.profile,
+                'width': result.width,
+                'height': result.height,
+                'scale': result.scale
+            })
+        except Exception as e:
+            logging.error(f"Не удалось отметить задачу {job.id} выполненной (попытка {attempt}): {e}")
+            await asyncio.sleep(min(attempt, COMPLETE_RETRY_MAX_DELAY))
+            continue
+        if not completed:
+            logging.warning(f"Задача {job.id} уже не принадлежит воркеру, выполнение не зафиксировано")
+        return
+
+async def handle_job(job: ProcessingJob):
+    """Обрабатывает задачу и отправляет результат пользователю"""
+    # Аренда истекала слишком много раз: воркеры падают на этой задаче
+    if job.attempts > job.max_attempts:
+        if processing_queue.fail(job.id, WORKER_ID, "Превышено количество попыток") == FAIL_FINAL:
+            await send_processing_error_to_telegram(job.chat_id)
+        return
+
+    lease_lost = asyncio.Event()
+    heartbeat = asyncio.create_task(keep_lease(job, lease_lost))
+    try:
+        try:
+            # Отображаем файл в память вместо чтения: изображение не копируется в процесс.
+            # Сама обработка идет в отдельном потоке, поэтому аренда продлевается и во время нее
+            with open(job.image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                result = await process_image_bytes(
+                    image,
+                    target_width=job.width,
+                    target_height=job.height,
+                    queue_depth=processing_queue.backlog(),
+                    queue_wait=time.time() - job.created_at
+                )
+
+            # Если аренду потеряли, задачу уже обрабатывает другой воркер — не дублируем документ
+            if lease_lost.is_set() or not processing_queue.extend_lease(job.id, WORKER_ID, LEASE_SECONDS):
+                logging.warning(f"Задача {job.id} передана другому воркеру, результат не отправляется")
+                return
+
+            await send_processing_result_to_telegram(job.chat_id, result, job.width, job.height)
+        except Exception as e:
+            logging.error(f"Ошибка при обработке задачи {job.id} (попытка {job.attempts}): {e}")
+            if processing_queue.fail(job.id, WORKER_ID, str(e)) == FAIL_FINAL:
+                await send_processing_error_to_telegram(job.chat_id)
+            return
+
+        # Документ уже у пользователя: фиксируем выполнение, не отпуская аренду
+        await complete_job(job, result, lease_lost)
+    finally:
+        heartbeat.cancel()
+
+    await delete_resize_options_message(job.chat_id, job.message_id)
+
+async def run_worker():
+    """Забирает задачи из очереди и обрабатывает их по одной до сигнала остановки"""
+    # По SIGTERM (docker compose stop, передеплой, уменьшение --scale) перестаем брать
+    # новые задачи, но текущую доводим до фиксации в очереди, чтобы ее не отправили повторно
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    logging.info(f"Воркер {WORKER_ID} запущен")
+    while not stopping.is_set():
+        try:
+            job = processing_queue.lease(WORKER_ID, LEASE_SECONDS)
+        except Exception as e:
+            logging.error(f"Ошибка при получении задачи из очереди: {e}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await handle_job(job)
+        except Exception as e:
+            logging.error(f"Ошибка при завершении задачи {job.id}: {e}")
+
+    logging.info(f"Воркер {WORKER_ID} остановлен")
+
+def main():
+    asyncio.run(run_worker())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Проверка пикового потребления памяти конвейером обработки.
+
+Изображение обрабатывается так же, как в воркере: файл отображается в память через mmap.
+Учитываются оба вида памяти: объекты Python (через tracemalloc) и пиксельные буферы Pillow,
+которые выделяются вне аллокатора Python и видны только в статистике Image.core.get_stats().
+"""
+import mmap
+import asyncio
+import threading
+import tracemalloc
+import pytest
+from PIL import Image
+from src.utils.image_processor import process_image_bytes
+from src.utils.load_monitor import PROFILES
+from loadtest.images import make_test_image
+
+WIDTH, HEIGHT = 3000, 2000
+# Pillow хранит RGB-изображение по 4 байта на пиксель
+DECODED_SIZE = WIDTH * HEIGHT * 4
+# Небольшой блок, чтобы статистика Pillow была точной
+BLOCK_SIZE = 1 << 20
+# Допустимые пики в долях от размера декодированных пикселей. Для Pillow это
+# исходник, промежуточный буфер ресайза и результат; лишняя полная копия превысит лимит
+MAX_PILLOW_RATIO = 2.5
+MAX_PYTHON_RATIO = 0.75
+
+TARGETS = [(WIDTH, HEIGHT), (1280, round(HEIGHT * 1280 / WIDTH))]
+
+@pytest.fixture(scope='module')
+def image_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('memory') / 'image.jpg'
+    path.write_bytes(make_test_image(WIDTH, HEIGHT))
+    return path
+
+@pytest.fixture
+def pillow_stats():
+    """Включает точный учет блоков Pillow и восстанавливает настройки после теста"""
+    block_size = Image.core.get_block_size()
+    blocks_max = Image.core.get_blocks_max()
+    # Без кеша блоков каждое выделение и освобождение попадает в статистику
+    Image.core.set_blocks_max(0)
+    Image.core.set_block_size(BLOCK_SIZE)
+    Image.core.reset_stats()
+    try:
+        yield
+    finally:
+        Image.core.set_block_size(block_size)
+        Image.core.set_blocks_max(blocks_max)
+
+def live_pillow_blocks() -> int:
+    stats = Image.core.get_stats()
+    return stats['allocated_blocks'] - stats['freed_blocks']
+
+def run_measured(path, target, profile) -> tuple:
+    """Обрабатывает изображение и возвращает пики памяти Pillow и Python в байтах"""
+    # Обработка идет в отдельном потоке и отпускает GIL, поэтому блоки Pillow
+    # можно опрашивать параллельно и увидеть даже промежуточные буферы ресайза
+    peak_blocks = 0
+    done = threading.Event()
+
+    def poll():
+        nonlocal peak_blocks
+        while not done.is_set():
+            peak_blocks = max(peak_blocks, live_pillow_blocks())
+            done.wait(0.0005)
+
+    poller = threading.Thread(target=poll)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+        tracemalloc.start()
+        poller.start()
+        try:
+            asyncio.run(process_image_bytes(image, *target, profile=profile))
+            python_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            done.set()
+            poller.join()
+            tracemalloc.stop()
+    peak_blocks = max(peak_blocks, live_pillow_blocks())
+    return peak_blocks * BLOCK_SIZE, python_peak
+
+@pytest.mark.parametrize('target', TARGETS, ids=lambda target: f'{target[0]}x{target[1]}')
+@pytest.mark.parametrize('profile', PROFILES, ids=lambda profile: profile.name)
+def test_peak_memory_per_job(image_path, pillow_stats, target, profile):
+    pillow_peak, python_peak = run_measured(image_path, target, profile)
+
+    assert pillow_peak <= MAX_PILLOW_RATIO * DECODED_SIZE
+    assert python_peak <= MAX_PYTHON_RATIO * DECODED_SIZE
+    # После задачи не должно остаться ни одного пиксельного буфера
+    assert live_pillow_blocks() == 0